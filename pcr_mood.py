@@ -1,23 +1,76 @@
 import dash
-from dash import dcc, html, Input, Output, State, callback_context
+from dash import dcc, html, Input, Output, State, callback_context, DiskcacheManager
+import diskcache
 import pandas as pd
 import yfinance as yf
-import plotly.express as px
+import requests
+import lxml.html
 import plotly.graph_objects as go
-from plotly.subplots import make_subplots
+from cachetools import TTLCache, cached
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from datetime import timedelta
+from pathlib import Path
+import io
+import json
+import os
+import random
+import threading
 import time
 import warnings
-warnings.filterwarnings("ignore", category=FutureWarning)
 
-# Sleep between API calls to avoid Yahoo Finance rate limiting
-SLEEP_SECONDS = 5
+# Small random per-thread backoff to spread concurrent Yahoo Finance requests
+JITTER_SECONDS = 0.5
+MAX_WORKERS = 5
+OPTION_CHAIN_WORKERS = 4
+PCR_BUCKET_SECONDS = 600
+
+DJIA_CACHE_PATH = Path("djia_cache.json")
+DJIA_CACHE_TTL = 86400
+DJIA_URL = 'https://en.wikipedia.org/wiki/Dow_Jones_Industrial_Average'
+SUBPLOT_TICKERS = ["AMZN", "AAPL", "NVDA", "TSLA"]
+HISTORY_CACHE_SECONDS = 900
+
+# Shared on disk so results survive the per-job processes of background callbacks
+cache = diskcache.Cache("./.dash_cache")
 
 # -----------------------------------------------------------------------------    
+def _parse_djia_symbols(content):
+    root = lxml.html.fromstring(content)
+    for table in root.xpath('//table[.//th[normalize-space()="Symbol"]]'):
+        rows = table.xpath('.//tr')
+        header = [cell.text_content().strip() for cell in rows[0].xpath('./th|./td')]
+        if 'Symbol' not in header:
+            continue
+        idx = header.index('Symbol')
+        symbols = []
+        for row in rows[1:]:
+            cells = row.xpath('./th|./td')
+            if len(cells) > idx:
+                symbols.append(cells[idx].text_content().strip())
+        if symbols:
+            return symbols
+    return []
+
+@cached(TTLCache(maxsize=1, ttl=86400))
 def get_djia():
-    url = 'https://en.wikipedia.org/wiki/Dow_Jones_Industrial_Average'
     try:
-        tables = pd.read_html(url)
+        r = requests.get(DJIA_URL, headers={'User-Agent': 'Mozilla/5.0'}, timeout=10)
+        r.raise_for_status()
+        page = r.text
+    except Exception as e:
+        print(f"Error downloading DJIA page, falling back to pandas: {e}")
+        page = None
+    if page is not None:
+        try:
+            symbols = _parse_djia_symbols(r.content)
+            if symbols:
+                return pd.DataFrame({'Symbol': symbols}), symbols
+        except Exception as e:
+            print(f"Error parsing DJIA table, falling back to pandas: {e}")
+    try:
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore', FutureWarning)
+            tables = pd.read_html(io.StringIO(page) if page is not None else DJIA_URL)
         for table in tables:
             if 'Symbol' in table.columns:
                 return table, table['Symbol'].tolist()
@@ -26,38 +79,145 @@ def get_djia():
         return pd.DataFrame(), []
     return pd.DataFrame(), []
 
-djia_df, djia_tickers = get_djia()
+def load_dropdown_options():
+    stored_options = None
+    try:
+        stored = json.loads(DJIA_CACHE_PATH.read_text())
+        stored_options = tuple(stored['options'])
+        if time.time() - stored['timestamp'] < DJIA_CACHE_TTL:
+            return stored_options
+    except (OSError, ValueError, KeyError, TypeError):
+        pass
 
-if not djia_tickers:
-    dropdown_options = [{'label': 'No data available', 'value': ''}]
-else:
-    dropdown_options = [{'label': ticker, 'value': ticker} for ticker in djia_tickers]
+    _, djia_tickers = get_djia()
+    if not djia_tickers:
+        # A stale list beats an empty dropdown when the scrape fails
+        return stored_options or ({'label': 'No data available', 'value': ''},)
 
-month_options = [{'label': f"{m} months back", 'value': m} for m in [6, 12, 18, 24, 30]]
+    options = tuple({'label': ticker, 'value': ticker} for ticker in djia_tickers)
+    try:
+        tmp_path = DJIA_CACHE_PATH.with_name(f"{DJIA_CACHE_PATH.name}.{os.getpid()}.tmp")
+        tmp_path.write_text(json.dumps({'timestamp': time.time(), 'options': options}))
+        tmp_path.replace(DJIA_CACHE_PATH)
+    except OSError as e:
+        print(f"Error writing DJIA cache file: {e}")
+    return options
+
+dropdown_options = load_dropdown_options()
+
+month_options = tuple({'label': f"{m} months back", 'value': m} for m in [6, 12, 18, 24, 30])
 
 # -----------------------------------------------------------------------------    
-def get_recent_options(ticker_obj, hours=96):
-    cutoff = pd.Timestamp.now(tz='UTC') - pd.Timedelta(hours=hours)
-    calls_list, puts_list = [], []
-    for expiry in ticker_obj.options:
+def _recent_volume(df, cutoff_ns):
+    ltd = df['lastTradeDate']
+    if not pd.api.types.is_datetime64_any_dtype(ltd):
+        ltd = pd.to_datetime(ltd, errors='coerce', utc=True)
+    mask = ltd.values.astype('datetime64[ns]', copy=False).view('i8') > cutoff_ns
+    if not mask.any():
+        return 0.0, False
+    return float(df['volume'].to_numpy(dtype=float, na_value=0.0)[mask].sum()), True
+
+# Caps option chain requests in flight across all tickers, not just per ticker
+_chain_slots = threading.BoundedSemaphore(OPTION_CHAIN_WORKERS)
+
+def _fetch_chain(ticker_obj, expiry):
+    try:
+        with _chain_slots:
+            return expiry, ticker_obj.option_chain(expiry)
+    except Exception as e:
+        print(f"Error fetching options chain for expiry {expiry}: {e}")
+        return expiry, None
+
+def get_recent_options(ticker_obj, cutoff_ts):
+    expiries = ticker_obj.options
+    if not expiries:
+        return 0.0, 0.0, False, 0
+
+    cutoff_ns = cutoff_ts.value
+    total_call_vol, total_put_vol, any_trades = 0.0, 0.0, False
+    failed = []
+    with ThreadPoolExecutor(max_workers=min(OPTION_CHAIN_WORKERS, len(expiries))) as ex:
+        chains = list(ex.map(lambda expiry: _fetch_chain(ticker_obj, expiry), expiries))
+    for expiry, chain in chains:
+        if chain is None:
+            failed.append(expiry)
+            continue
         try:
-            chain = ticker_obj.option_chain(expiry)
-            calls_df = chain.calls.copy()
-            puts_df = chain.puts.copy()
-            calls_df['lastTradeDate'] = pd.to_datetime(calls_df['lastTradeDate'], errors='coerce')
-            puts_df['lastTradeDate'] = pd.to_datetime(puts_df['lastTradeDate'], errors='coerce')
-            calls_recent = calls_df[calls_df['lastTradeDate'] > cutoff]
-            puts_recent = puts_df[puts_df['lastTradeDate'] > cutoff]
-            if not calls_recent.empty:
-                calls_list.append(calls_recent)
-            if not puts_recent.empty:
-                puts_list.append(puts_recent)
+            call_vol, call_trades = _recent_volume(chain.calls, cutoff_ns)
+            put_vol, put_trades = _recent_volume(chain.puts, cutoff_ns)
+            total_call_vol += call_vol
+            total_put_vol += put_vol
+            any_trades = any_trades or call_trades or put_trades
         except Exception as e:
-            print(f"Error fetching options chain for expiry {expiry}: {e}")
-    return pd.concat(calls_list) if calls_list else pd.DataFrame(), pd.concat(puts_list) if puts_list else pd.DataFrame()
+            print(f"Error reading options chain for expiry {expiry}: {e}")
+            failed.append(expiry)
+    if failed:
+        print(f"Computed {ticker_obj.ticker} option totals without {len(failed)} of {len(expiries)} expiries: {', '.join(failed)}")
+    return total_call_vol, total_put_vol, any_trades, len(failed)
+
+def _cached_history(symbols, start, end):
+    key = ('history', symbols, start.date(), end.date())
+    prices = cache.get(key)
+    if prices is None:
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore', FutureWarning)
+            prices = yf.download(tickers=" ".join(symbols), start=start, end=end, interval='1d', auto_adjust=False,
+                                 actions=False, prepost=False, group_by='ticker', threads=True, progress=False)
+        # A symbol Yahoo failed to return comes back as all-NaN columns; don't pin that
+        if all(not _split_history(prices, sym).empty for sym in symbols):
+            cache.set(key, prices, expire=HISTORY_CACHE_SECONDS)
+    return prices
+
+def compute_pcr(sym):
+    bucket = int(time.time() // PCR_BUCKET_SECONDS)
+    key = ('pcr', sym, bucket)
+    result = cache.get(key)
+    if result is None:
+        # Derive the cutoff from the bucket so a cached ratio always matches its key
+        cutoff_ts = pd.Timestamp(bucket * PCR_BUCKET_SECONDS, unit='s', tz='UTC') - pd.Timedelta(hours=96)
+        time.sleep(random.uniform(0, JITTER_SECONDS))
+        total_call_vol, total_put_vol, any_trades, failed = get_recent_options(yf.Ticker(sym), cutoff_ts)
+        pcr_vol = total_put_vol / total_call_vol if total_call_vol else None
+        result = (pcr_vol, any_trades, failed)
+        # Partial totals are shown once but not cached, so the next callback retries the missing expiries
+        if not failed:
+            cache.set(key, result, expire=PCR_BUCKET_SECONDS)
+    return result
+
+def _split_history(prices, sym):
+    if sym not in prices.columns.get_level_values(0):
+        return pd.Series(dtype=float)
+    hist = prices[sym]
+    y_col = "Adj Close" if "Adj Close" in hist.columns else "Close"
+    return hist[y_col].dropna()
+
+def fetch_all(symbols, start, end):
+    symbols = tuple(symbols)
+    results = {}
+    with ThreadPoolExecutor(max_workers=MAX_WORKERS) as ex:
+        futures = {ex.submit(compute_pcr, s): s for s in symbols}
+        try:
+            prices = _cached_history(symbols, start, end)
+            history_error = None
+        except Exception as e:
+            prices, history_error = None, e
+        for future in as_completed(futures):
+            sym = futures[future]
+            if history_error is not None:
+                results[sym] = history_error
+                continue
+            try:
+                pcr_vol, any_trades, failed = future.result()
+                options_error = None
+            except Exception as e:
+                pcr_vol, any_trades, failed, options_error = None, False, 0, e
+            results[sym] = (sym, _split_history(prices, sym), pcr_vol, any_trades, failed, options_error)
+    return results
 
 # -----------------------------------------------------------------------------    
-app = dash.Dash(__name__)
+background_callback_manager = DiskcacheManager(cache)
+
+app = dash.Dash(__name__, background_callback_manager=background_callback_manager)
 server = app.server
 
 app.layout = html.Div([
@@ -82,8 +242,9 @@ app.layout = html.Div([
         html.Button("Reset", id="reset-button", n_clicks=0)
     ]),
     html.Br(),
+    html.Div(id="status-message", style={"marginTop": "20px"}),
     html.Div(id="error-message", style={"color": "red", "marginTop": "20px"}),
-    html.Div(id="main-content")
+    dcc.Loading(html.Div(id="main-content"))
 ])
 
 # -----------------------------------------------------------------------------    
@@ -97,7 +258,11 @@ app.layout = html.Div([
      Input("reset-button", "n_clicks")],
     [State("ticker-input", "value"),
      State("ticker-dropdown", "value"),
-     State("months-dropdown", "value")]
+     State("months-dropdown", "value")],
+    prevent_initial_call=True,
+    background=True,
+    running=[(Output("go-button", "disabled"), True, False),
+             (Output("status-message", "children"), "Fetching market data...", "")]
 )
 def update_output(go_clicks, reset_clicks, ticker_input, ticker_dropdown, months_selected):
     ctx = callback_context
@@ -122,20 +287,21 @@ def update_output(go_clicks, reset_clicks, ticker_input, ticker_dropdown, months
 
     ticker = ticker_dropdown.strip().upper() if ticker_dropdown else ticker_input.strip().upper()
 
-    try:
-        ticker_obj = yf.Ticker(ticker)
-        end_date = pd.Timestamp.now(tz='UTC')
-        start_date = end_date - pd.Timedelta(days=months_selected * 30)
-        hist = ticker_obj.history(start=start_date, end=end_date, interval='1d', auto_adjust=False)
-    except Exception as e:
-        return f"Error fetching data for {ticker}: {e}", "", ticker_input, ticker_dropdown, months_selected
+    end_date = pd.Timestamp.now(tz='UTC')
+    start_date = end_date - pd.Timedelta(days=months_selected * 30)
+    results = fetch_all(list(dict.fromkeys([ticker] + SUBPLOT_TICKERS)), start_date, end_date)
+
+    result = results[ticker]
+    if isinstance(result, Exception):
+        return f"Error fetching data for {ticker}: {result}", "", ticker_input, ticker_dropdown, months_selected
+    _, hist, pcr_vol, any_trades, failed, options_error = result
 
     if hist.empty:
         return f"No historical data found for ticker {ticker}.", "", ticker_input, ticker_dropdown, months_selected
 
-    y_col = "Adj Close" if "Adj Close" in hist.columns else "Close"
-    fig_main = px.line(hist, x=hist.index, y=y_col, title="")
+    fig_main = go.Figure(go.Scattergl(x=hist.index.to_numpy(), y=hist.to_numpy(), mode="lines"))
     fig_main.update_layout(
+        title="",
         annotations=[
             dict(
                 text="Created by Benjamin Zu Yao Teoh | February 2025 | Alpharetta, GA",
@@ -148,66 +314,56 @@ def update_output(go_clicks, reset_clicks, ticker_input, ticker_dropdown, months
 
     pcr_info = []
     try:
-        calls_combined, puts_combined = get_recent_options(ticker_obj, hours=96)
-        if calls_combined.empty and puts_combined.empty:
+        if options_error is not None:
+            raise options_error
+        if not any_trades:
             pcr_info.append(html.P("No options traded in the last 96 hours (4 days) for this ticker."))
         else:
-            total_call_vol = calls_combined['volume'].sum()
-            total_put_vol = puts_combined['volume'].sum()
-            pcr_vol = total_put_vol / total_call_vol if total_call_vol else None
             pcr_info.append(html.P(f"Current PCR (Volume) for {ticker}: {pcr_vol:.2f}" if pcr_vol is not None else "PCR (Volume): N/A"))
+        if failed:
+            pcr_info.append(html.P(f"{failed} option expiries could not be fetched; PCR is based on the remaining expiries."))
     except Exception as e:
         pcr_info.append(html.P(f"Error computing options data: {e}"))
 
-    subplot_tickers = ["AMZN", "AAPL", "NVDA", "TSLA"]
-    fig_sub = make_subplots(rows=2, cols=2, subplot_titles=subplot_tickers)
+    subplot_graphs = []
     subplot_pcr_info = []
-    row, col = 1, 1
 
-    for sub_ticker in subplot_tickers:
+    for sub_ticker in SUBPLOT_TICKERS:
+        fig_sub = go.Figure()
+        fig_sub.update_layout(title=sub_ticker, margin=dict(l=20, r=20, t=30, b=20), height=300)
         try:
-            time.sleep(SLEEP_SECONDS)  # <<< prevent rate-limiting
-            sub_obj = yf.Ticker(sub_ticker)
-            sub_hist = sub_obj.history(start=start_date, end=end_date, interval='1d', auto_adjust=False)
+            result = results[sub_ticker]
+            if isinstance(result, Exception):
+                raise result
+            _, sub_hist, pcr_vol_sub, any_trades_sub, failed_sub, options_error = result
 
             if not sub_hist.empty:
-                sub_y_col = "Adj Close" if "Adj Close" in sub_hist.columns else "Close"
                 fig_sub.add_trace(
-                    go.Scatter(
-                        x=sub_hist.index,
-                        y=sub_hist[sub_y_col],
+                    go.Scattergl(
+                        x=sub_hist.index.to_numpy(),
+                        y=sub_hist.to_numpy(),
                         mode="lines",
                         # line=dict(color="purple"),
                         showlegend=False
-                    ),
-                    row=row, col=col
+                    )
                 )
             else:
-                fig_sub.add_annotation(text="No data", row=row, col=col)
+                fig_sub.add_annotation(text="No data", showarrow=False)
 
-            calls_sub, puts_sub = get_recent_options(sub_obj, hours=96)
-            if calls_sub.empty and puts_sub.empty:
+            if options_error is not None:
+                raise options_error
+            if not any_trades_sub:
                 subplot_pcr_info.append(html.P(f"{sub_ticker} - No options traded in the last 96 hours."))
             else:
-                total_call_vol_sub = calls_sub['volume'].sum()
-                total_put_vol_sub = puts_sub['volume'].sum()
-                pcr_vol_sub = total_put_vol_sub / total_call_vol_sub if total_call_vol_sub else None
                 subplot_pcr_info.append(html.P(
                     f"{sub_ticker} - PCR (Volume): {pcr_vol_sub:.2f}" if pcr_vol_sub is not None else f"{sub_ticker} - PCR (Volume): N/A"
                 ))
+            if failed_sub:
+                subplot_pcr_info.append(html.P(f"{sub_ticker} - {failed_sub} option expiries could not be fetched; PCR is based on the rest."))
         except Exception as e:
             subplot_pcr_info.append(html.P(f"{sub_ticker} - Error: {e}"))
 
-        if col == 2:
-            col = 1
-            row += 1
-        else:
-            col += 1
-
-    fig_sub.update_layout(
-        autosize=True,
-        title_text="Historical Closing Price (not adjusted)"
-    )
+        subplot_graphs.append(dcc.Graph(figure=fig_sub))
 
     content = [
         html.H2(f"Historical Closing Price Data for {ticker} (not adjusted)"),
@@ -222,7 +378,11 @@ def update_output(go_clicks, reset_clicks, ticker_input, ticker_dropdown, months
             style={'fontSize': '14px'}
         ),
         html.H2("Corresponding Plots for Amazon, Apple, Nvidia, and Tesla"),
-        dcc.Graph(figure=fig_sub),
+        html.H3("Historical Closing Price (not adjusted)"),
+        html.Div(
+            subplot_graphs,
+            style={'display': 'grid', 'gridTemplateColumns': '1fr 1fr', 'gridTemplateRows': '1fr 1fr', 'gap': '10px'}
+        ),
         html.H3("Put-Call Ratios (for options traded in the last 4 days)"),
         html.Div(subplot_pcr_info)
     ]